@@ -1,13 +1,98 @@
+import asyncio
 import typer
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from .config import Config
 from .fetcher import fetch_article, clean_content, get_title, create_epub
-from .sender import send_email
 
 app = typer.Typer()
 console = Console()
 
+# Bound how many articles are in flight at once so we don't hammer
+# Wikipedia (or trip SMTP rate limits) when the user pastes a long list.
+MAX_CONCURRENT_ARTICLES = 4
+
+
+def _build_epub(url: str, progress: Progress, task_id) -> tuple:
+    """
+    Runs the blocking fetch-and-convert pipeline for one URL.
+    Returns (title, epub_bytes, filename); sending happens separately.
+    """
+    # Fetch from Wikipedia API
+    progress.update(task_id, description=f"Fetching {url}...")
+    article_data = fetch_article(url)
+
+    # Get title
+    title = get_title(article_data)
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
+    filename = f"{safe_title}.epub"
+
+    # Convert to HTML (with section image references)
+    progress.update(task_id, description=f"Processing '{title}'...")
+    body_content, image_refs = clean_content(article_data)
+
+    # Create EPUB (with lead image and section images)
+    progress.update(task_id, description=f"Creating EPUB for '{title}'...")
+    epub_file = create_epub(
+        title,
+        body_content,
+        source_url=url,
+        image_data=article_data.get('image'),
+        image_filename=article_data.get('image_filename'),
+        image_refs=image_refs
+    )
+
+    return title, epub_file, filename
+
+
+async def _run(url_list: list):
+    """
+    Processes all URLs concurrently. Each pipeline is dominated by
+    blocking network I/O, so pipelines run in worker threads and their
+    waits overlap instead of paying one round trip after another.
+    Finished EPUBs are handed to a background SendWorker that pushes
+    them over one reused SMTP connection while fetches continue.
+    """
+    # Imported here rather than at module top: smtplib drags in the
+    # email package and ssl (tens of ms cold), none of which --help or
+    # a config error ever needs.
+    from .sender import SendWorker
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ARTICLES)
+    sender = SendWorker()
+
+    try:
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            transient=True,
+        ) as progress:
+
+            async def process(url: str):
+                task_id = progress.add_task(description=f"Processing {url}...", total=None)
+                try:
+                    # Hold a fetch slot only while downloading/converting;
+                    # release it before the (potentially slow) SMTP send.
+                    async with semaphore:
+                        title, epub_file, filename = await loop.run_in_executor(
+                            None, _build_epub, url, progress, task_id
+                        )
+
+                    progress.update(task_id, description=f"Sending '{title}' to Kindle...")
+                    await asyncio.wrap_future(
+                        sender.enqueue(f"Convert: {title}", epub_file, filename)
+                    )
+                    console.print(f"[green]✓[/green] Successfully sent '[bold]{title}[/bold]' to Kindle.")
+                except Exception as e:
+                    console.print(f"[red]✗[/red] Failed to process {url}: {e}")
+                finally:
+                    progress.remove_task(task_id)
+
+            await asyncio.gather(*(process(url) for url in url_list))
+    finally:
+        sender.close()
+
 
 @app.command()
 def main(urls: str = typer.Argument(..., help="Comma-separated list of Wikipedia URLs")):
@@ -20,51 +105,11 @@ def main(urls: str = typer.Argument(..., help="Comma-separated list of Wikipedia
         console.print(f"[red]Configuration Error:[/red] {e}")
         raise typer.Exit(code=1)
 
-    url_list = [url.strip() for url in urls.split(',')]
-
-    with Progress(
-        SpinnerColumn(),
-        TextColumn("[progress.description]{task.description}"),
-        transient=True,
-    ) as progress:
-        for url in url_list:
-            task_id = progress.add_task(description=f"Processing {url}...", total=None)
-            try:
-                # Fetch from Wikipedia API
-                progress.update(task_id, description=f"Fetching {url}...")
-                article_data = fetch_article(url)
-
-                # Get title
-                title = get_title(article_data)
-                safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-                filename = f"{safe_title}.epub"
-
-                # Convert to HTML (with section image references)
-                progress.update(task_id, description=f"Processing '{title}'...")
-                section_images = article_data.get('section_images', {})
-                body_content, image_refs = clean_content(article_data, section_images)
-
-                # Create EPUB (with lead image and section images)
-                progress.update(task_id, description=f"Creating EPUB for '{title}'...")
-                epub_bytes = create_epub(
-                    title,
-                    body_content,
-                    source_url=url,
-                    image_data=article_data.get('image'),
-                    image_filename=article_data.get('image_filename'),
-                    image_refs=image_refs
-                )
-
-                # Send
-                progress.update(task_id, description=f"Sending '{title}' to Kindle...")
-                send_email(f"Convert: {title}", epub_bytes, filename)
-
-                console.print(f"[green]✓[/green] Successfully sent '[bold]{title}[/bold]' to Kindle.")
-
-            except Exception as e:
-                console.print(f"[red]✗[/red] Failed to process {url}: {e}")
-            finally:
-                progress.remove_task(task_id)
+    # De-duplicate while preserving order - a pasted duplicate would
+    # otherwise run the whole fetch/convert/send pipeline twice.
+    url_list = list(dict.fromkeys(url.strip() for url in urls.split(',') if url.strip()))
+
+    asyncio.run(_run(url_list))
 
 
 if __name__ == "__main__":
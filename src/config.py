@@ -1,28 +1,40 @@
 import os
-from dotenv import load_dotenv
 
 from pathlib import Path
 
-# Load from current directory OR home directory
-# This allows the tool to work globally if the user puts the .env in their home folder
-env_path = Path.home() / ".kindle-wikipedia-cli.env"
-load_dotenv(dotenv_path=env_path)
-load_dotenv() # Also try default (current directory) as fallback/override
+# Load from the home directory first (so the tool works globally),
+# then the current directory as fallback/override. Always read the
+# dotfiles: skipping them when the required vars are exported would
+# silently drop any optional settings that live only in the files.
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path=Path.home() / ".kindle-wikipedia-cli.env")
+load_dotenv()
 
 class Config:
     SMTP_HOST = os.getenv("SMTP_HOST")
     SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
     SMTP_USER = os.getenv("SMTP_USER")
     SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    # Optional OAuth2 access token; when set, connections authenticate
+    # with AUTH XOAUTH2 instead of username/password
+    SMTP_OAUTH_TOKEN = os.getenv("SMTP_OAUTH_TOKEN")
     KINDLE_EMAIL = os.getenv("KINDLE_EMAIL")
+    # Parallel SMTP connections used by the async batch sender
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+    # Re-deflate EPUBs at maximum compression before sending
+    RECOMPRESS_EPUB = os.getenv("RECOMPRESS_EPUB", "").lower() in ("1", "true", "yes")
 
     @classmethod
     def validate(cls):
         missing = []
         if not cls.SMTP_HOST: missing.append("SMTP_HOST")
         if not cls.SMTP_USER: missing.append("SMTP_USER")
-        if not cls.SMTP_PASSWORD: missing.append("SMTP_PASSWORD")
+        # Either credential works: a password for AUTH LOGIN or an
+        # OAuth token for AUTH XOAUTH2
+        if not cls.SMTP_PASSWORD and not cls.SMTP_OAUTH_TOKEN:
+            missing.append("SMTP_PASSWORD or SMTP_OAUTH_TOKEN")
         if not cls.KINDLE_EMAIL: missing.append("KINDLE_EMAIL")
-        
+
         if missing:
             raise ValueError(f"Missing configuration variables: {', '.join(missing)}. Please check your .env file.")
@@ -1,28 +1,134 @@
+import lxml.html
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ebooklib import epub
-from io import BytesIO
+from io import BytesIO, StringIO
+from functools import lru_cache
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
+import pickle
+import time
 import uuid
 import re
 import html
 from urllib.parse import unquote
 
+_TITLE_RE = re.compile(r'title=([^&]+)')
+# Section headers in the plain-text extract: == Title ==, === Title ===, ...
+# Compiled once; clean_content matches it against every line of the extract.
+_HEADER_RE = re.compile(r'^(={2,6})\s*(.+?)\s*\1$')
+# Fixed heading tag pairs so the hot loop in clean_content writes constant
+# strings instead of formatting a fresh f-string (and its temporaries) per line
+_H_TAGS = {level: (f'<h{level}>', f'</h{level}>\n') for level in range(2, 7)}
+# Same characters html.escape(quote=True) handles, but str.translate does a
+# single C-level pass instead of five chained .replace calls per line
+_HTML_ESCAPE = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;',
+})
+
+# One pooled session for every Wikipedia request the module makes.
+# Bare requests.get() opens (and tears down) a fresh TCP+TLS connection
+# per call; keep-alive through a shared session means the API call and
+# all the image fetches reuse a handful of connections instead.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+# Every section image lives on upload.wikimedia.org, and the default
+# per-host pool of 10 overflows (and churns connections) on articles
+# with more figures than that. Give the image host its own adapter
+# sized past the typical figure count, with retries for the transient
+# 50x responses the CDN occasionally returns.
+_SESSION.mount('https://upload.wikimedia.org/', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504)),
+))
+_SESSION.headers.update({
+    'User-Agent': 'KindleWikipediaCLI/0.1.0 (https://github.com/kindle-wikipedia-cli)'
+})
+
+_MEDIA_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+
+
+# Fetched articles are cached on disk so a re-run for the same URL
+# (retry after an SMTP failure, duplicate list entries across runs)
+# skips the API calls and every image download.
+_CACHE_DIR = Path.home() / '.cache' / 'kindle-wikipedia-cli'
+_CACHE_TTL = 86400  # seconds - articles rarely change within a day
+
+# Extracts shorter than this are stubs or disambiguation pages; the
+# section-image parse (a ~1 MB HTML download) is wasted work for them.
+_STUB_EXTRACT_LEN = 2000
+
+
+def _cache_path(url: str) -> Path:
+    return _CACHE_DIR / (hashlib.sha1(url.encode('utf-8')).hexdigest() + '.pickle')
+
+
+def _cache_load(url: str):
+    """
+    Returns the cached article dict for the URL, or None if absent/stale.
+    """
+    path = _cache_path(url)
+    try:
+        if time.time() - path.stat().st_mtime < _CACHE_TTL:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError):
+        pass  # Missing or corrupt cache entry - just refetch
+    return None
+
+
+def _cache_store(url: str, article: dict):
+    """
+    Persists the article dict for the URL; failures are non-fatal.
+    """
+    path = _cache_path(url)
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump(article, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)  # Atomic so a crashed run can't leave a torn entry
+    except OSError:
+        pass
+
 
+def _get_media_type(filename: str) -> str:
+    """
+    Maps an image filename to its EPUB media type (defaults to JPEG).
+    """
+    ext = filename.lower().split('.')[-1]
+    return _MEDIA_TYPES.get(ext, 'image/jpeg')
+
+
+@lru_cache(maxsize=1024)
 def extract_title_from_url(url: str) -> str:
     """
     Extracts the article title from a Wikipedia URL.
     e.g., 'https://en.wikipedia.org/wiki/HAL_Tejas' -> 'HAL_Tejas'
+
+    Cached since the same URL is parsed repeatedly across fetches and retries.
     """
     # Handle both /wiki/Title and /w/index.php?title=Title formats
     if '/wiki/' in url:
         return url.split('/wiki/')[-1].split('#')[0].split('?')[0]
     elif 'title=' in url:
-        match = re.search(r'title=([^&]+)', url)
+        match = _TITLE_RE.search(url)
         if match:
             return match.group(1)
     raise ValueError(f"Could not extract article title from URL: {url}")
 
 
-def fetch_section_images(title: str, headers: dict) -> dict:
+def fetch_section_images(title: str) -> dict:
     """
     Fetches HTML and maps section headings to their image URLs.
     Returns a dict like {'Section Name': ['url1', 'url2'], ...}
@@ -37,7 +143,7 @@ def fetch_section_images(title: str, headers: dict) -> dict:
     }
 
     try:
-        response = requests.get(api_url, params=params, headers=headers)
+        response = _SESSION.get(api_url, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -48,21 +154,25 @@ def fetch_section_images(title: str, headers: dict) -> dict:
         if not html_content:
             return {}
 
-        # Collect all headings and images with their positions
-        items = []
-
-        # Find h2 and h3 headings
-        for m in re.finditer(r'<h([23])[^>]*id="([^"]+)"[^>]*>([^<]+)</h\1>', html_content):
-            heading_text = m.group(3).strip()
-            items.append((m.start(), 'heading', heading_text))
-
-        # Find figures with images (skip infobox by checking position)
-        # Infobox is typically in the first ~20k chars
-        for m in re.finditer(r'<figure[^>]*>(.*?)</figure>', html_content, re.DOTALL):
-            figure_html = m.group(1)
-            img_match = re.search(r'<img[^>]*src="([^"]+)"', figure_html)
-            if img_match:
-                src = img_match.group(1)
+        # One walk over the parsed tree, in document order, maps images
+        # to the heading that precedes them - no position sorting needed.
+        tree = lxml.html.fromstring(html_content)
+
+        section_images = {'_lead': []}
+        current_section = '_lead'
+
+        for element in tree.iter('h2', 'h3', 'figure'):
+            if element.tag in ('h2', 'h3'):
+                heading_text = element.text_content().strip()
+                if heading_text:
+                    current_section = heading_text
+                    if current_section not in section_images:
+                        section_images[current_section] = []
+            else:  # figure
+                img = element.find('.//img')
+                if img is None:
+                    continue
+                src = img.get('src', '')
                 # Only include wikimedia images, skip icons/logos
                 if 'upload.wikimedia' in src and not any(skip in src.lower() for skip in [
                     'icon', 'logo', 'flag_of', 'commons-logo', 'edit-ltr', 'ambox',
@@ -71,22 +181,7 @@ def fetch_section_images(title: str, headers: dict) -> dict:
                     # Convert protocol-relative URL to https
                     if src.startswith('//'):
                         src = 'https:' + src
-                    items.append((m.start(), 'image', src))
-
-        # Sort by position
-        items.sort(key=lambda x: x[0])
-
-        # Map images to sections
-        section_images = {'_lead': []}
-        current_section = '_lead'
-
-        for pos, item_type, value in items:
-            if item_type == 'heading':
-                current_section = value
-                if current_section not in section_images:
-                    section_images[current_section] = []
-            else:  # image
-                section_images[current_section].append(value)
+                    section_images[current_section].append(src)
 
         # Remove empty sections
         return {k: v for k, v in section_images.items() if v}
@@ -100,27 +195,35 @@ def fetch_article(url: str) -> dict:
     Fetches Wikipedia article content using the Action API.
     Returns a dict with 'title', 'content' (plain text with wiki markup for sections),
     and optionally 'image' (bytes) and 'image_filename'.
+
+    Results are served from the on-disk cache when fresh (24 h).
     """
+    cached = _cache_load(url)
+    if cached is not None:
+        return cached
+
     title = extract_title_from_url(url)
 
     # Use Wikipedia's Action API to get clean extract + main image
     api_url = "https://en.wikipedia.org/w/api.php"
     params = {
         'action': 'query',
-        'prop': 'extracts|pageimages',
+        'prop': 'extracts|pageimages|pageprops',
         'titles': title,
         'format': 'json',
         'explaintext': '1',  # Plain text, no HTML
         'exsectionformat': 'wiki',  # Keep section markers
         'pithumbsize': '800',  # Get thumbnail at 800px width
+        'ppprop': 'disambiguation',  # Lets us skip section images for stubs
     }
 
-    headers = {
-        'User-Agent': 'KindleWikipediaCLI/0.1.0 (https://github.com/kindle-wikipedia-cli)'
-    }
-
+    # The extract query and the parsed-HTML fetch both only need the
+    # title, so run them concurrently - two sequential API round trips
+    # become one round trip of wall time.
+    pool = ThreadPoolExecutor(max_workers=1)
+    section_future = pool.submit(fetch_section_images, title)
     try:
-        response = requests.get(api_url, params=params, headers=headers)
+        response = _SESSION.get(api_url, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -139,12 +242,21 @@ def fetch_article(url: str) -> dict:
             'content': page.get('extract', '')
         }
 
+        # Stubs and disambiguation pages have no sections worth
+        # illustrating - don't wait on (or parse) the section-image
+        # HTML for them.
+        if (len(result['content']) < _STUB_EXTRACT_LEN
+                or 'disambiguation' in page.get('pageprops', {})):
+            section_future.cancel()
+            _cache_store(url, result)
+            return result
+
         # Fetch the main image if available
         thumbnail = page.get('thumbnail', {})
         image_url = thumbnail.get('source')
         if image_url:
             try:
-                img_response = requests.get(image_url, headers=headers)
+                img_response = _SESSION.get(image_url)
                 img_response.raise_for_status()
                 result['image'] = img_response.content
                 # Extract filename from URL
@@ -152,15 +264,19 @@ def fetch_article(url: str) -> dict:
             except requests.RequestException:
                 pass  # Image fetch failed, continue without it
 
-        # Fetch section images from HTML
-        section_images = fetch_section_images(title, headers)
+        # Section images were fetched in parallel with the extract
+        section_images = section_future.result()
         if section_images:
             result['section_images'] = section_images
 
+        _cache_store(url, result)
         return result
 
     except requests.RequestException as e:
         raise RuntimeError(f"Failed to fetch article: {e}")
+    finally:
+        # Don't block on a section fetch we decided not to use
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 def get_title(article_data: dict) -> str:
@@ -184,6 +300,10 @@ def clean_content(article_data: dict, section_images: dict = None) -> tuple:
     """
     if isinstance(article_data, dict):
         content = article_data.get('content', '')
+        # Default to the section images already carried by the fetched
+        # data, so callers hand over one object instead of re-deriving it.
+        if section_images is None:
+            section_images = article_data.get('section_images', {})
     else:
         content = str(article_data)
 
@@ -192,16 +312,14 @@ def clean_content(article_data: dict, section_images: dict = None) -> tuple:
 
     section_images = section_images or {}
     lines = content.split('\n')
-    html_parts = []
+    buf = StringIO()
     image_refs = []  # (filename, url) pairs
     image_counter = 0
 
-    # Helper to generate image HTML for a section
-    def get_section_image_html(section_name):
+    # Helper to write image HTML for a section into the buffer
+    def write_section_images(section_name):
         nonlocal image_counter
-        urls = section_images.get(section_name, [])
-        img_html_parts = []
-        for url in urls:
+        for url in section_images.get(section_name, []):
             # Generate a unique filename
             ext = url.split('.')[-1].split('?')[0].lower()
             if ext not in ('jpg', 'jpeg', 'png', 'gif', 'webp'):
@@ -209,15 +327,12 @@ def clean_content(article_data: dict, section_images: dict = None) -> tuple:
             filename = f"img_{image_counter}.{ext}"
             image_counter += 1
             image_refs.append((filename, url))
-            img_html_parts.append(
-                f'<p style="text-align:center;"><img src="images/{filename}" alt="" style="max-width:100%;"/></p>'
+            buf.write(
+                f'<p style="text-align:center;"><img src="images/{filename}" alt="" style="max-width:100%;"/></p>\n'
             )
-        return '\n'.join(img_html_parts)
 
     # Add lead images (before first heading)
-    lead_img_html = get_section_image_html('_lead')
-    if lead_img_html:
-        html_parts.append(lead_img_html)
+    write_section_images('_lead')
 
     for line in lines:
         line = line.strip()
@@ -225,33 +340,34 @@ def clean_content(article_data: dict, section_images: dict = None) -> tuple:
             continue
 
         # Check for section headers (== Title ==, === Title ===, etc.)
-        header_match = re.match(r'^(={2,6})\s*(.+?)\s*\1$', line)
+        header_match = _HEADER_RE.match(line)
         if header_match:
             level = len(header_match.group(1))
             section_title = header_match.group(2)
             # Map == to h2, === to h3, etc.
             h_level = min(level, 6)
-            escaped_title = html.escape(section_title)
-            html_parts.append(f'<h{h_level}>{escaped_title}</h{h_level}>')
+            open_tag, close_tag = _H_TAGS[h_level]
+            buf.write(open_tag)
+            buf.write(section_title.translate(_HTML_ESCAPE))
+            buf.write(close_tag)
 
             # Add images for this section right after the heading
-            section_img_html = get_section_image_html(section_title)
-            if section_img_html:
-                html_parts.append(section_img_html)
+            write_section_images(section_title)
         else:
             # Regular paragraph
-            escaped_text = html.escape(line)
-            html_parts.append(f'<p>{escaped_text}</p>')
+            buf.write('<p>')
+            buf.write(line.translate(_HTML_ESCAPE))
+            buf.write('</p>\n')
 
-    if not html_parts:
+    if not buf.tell():
         return "<p>No content found.</p>", []
 
-    return '\n'.join(html_parts), image_refs
+    return buf.getvalue().rstrip('\n'), image_refs
 
 
 def create_epub(title: str, body_content: str, source_url: str = "",
                 image_data: bytes = None, image_filename: str = None,
-                image_refs: list = None) -> bytes:
+                image_refs: list = None) -> BytesIO:
     """
     Creates an EPUB file from the given title and body content.
     Optionally includes a lead image and section images.
@@ -264,7 +380,8 @@ def create_epub(title: str, body_content: str, source_url: str = "",
         image_filename: Lead image filename (optional)
         image_refs: List of (filename, url) tuples for section images (optional)
 
-    Returns the EPUB as bytes.
+    Returns the EPUB as a BytesIO positioned at the start, so callers
+    can hand the buffer (or a memoryview of it) on without copying.
     """
     book = epub.EpubBook()
 
@@ -280,47 +397,47 @@ def create_epub(title: str, body_content: str, source_url: str = "",
     # Escape title for safe XML usage
     safe_title = html.escape(title)
 
-    # Media type helper
-    def get_media_type(filename):
-        ext = filename.lower().split('.')[-1]
-        media_types = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'gif': 'image/gif',
-            'svg': 'image/svg+xml',
-            'webp': 'image/webp',
-        }
-        return media_types.get(ext, 'image/jpeg')
+    # Collect every image first, then register them with the book in one
+    # tight loop at the end, keeping download error handling out of the
+    # ebooklib bookkeeping.
+    image_items = []
 
     # Handle lead image if provided
     lead_image_html = ""
     if image_data and image_filename:
         img_item = epub.EpubImage()
         img_item.file_name = f"images/{image_filename}"
-        img_item.media_type = get_media_type(image_filename)
+        img_item.media_type = _get_media_type(image_filename)
         img_item.content = image_data
-        book.add_item(img_item)
+        image_items.append(img_item)
         lead_image_html = f'<p style="text-align:center;"><img src="images/{html.escape(image_filename)}" alt="{safe_title}" style="max-width:100%;"/></p>'
 
-    # Download and add section images
-    headers = {
-        'User-Agent': 'KindleWikipediaCLI/0.1.0 (https://github.com/kindle-wikipedia-cli)'
-    }
+    # Download section images concurrently - a serial loop pays one full
+    # round trip per figure, so N images take ~N RTTs instead of ~1.
     if image_refs:
-        for filename, url in image_refs:
-            try:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+        def download_image(filename, url):
+            response = _SESSION.get(url, timeout=10)
+            response.raise_for_status()
+            return filename, response.content
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(download_image, filename, url)
+                       for filename, url in image_refs]
+            for future in as_completed(futures):
+                try:
+                    filename, content = future.result()
+                except requests.RequestException:
+                    # Skip failed images - the HTML will show a broken image
+                    # which is better than failing the whole EPUB
+                    continue
                 img_item = epub.EpubImage()
                 img_item.file_name = f"images/{filename}"
-                img_item.media_type = get_media_type(filename)
-                img_item.content = response.content
-                book.add_item(img_item)
-            except requests.RequestException:
-                # Skip failed images - the HTML will show a broken image
-                # which is better than failing the whole EPUB
-                pass
+                img_item.media_type = _get_media_type(filename)
+                img_item.content = content
+                image_items.append(img_item)
+
+    for img_item in image_items:
+        book.add_item(img_item)
 
     # Create the chapter with the article content
     chapter = epub.EpubHtml(
@@ -348,7 +465,9 @@ def create_epub(title: str, body_content: str, source_url: str = "",
     book.add_item(epub.EpubNav())
     book.spine = [chapter]
 
-    # Write to BytesIO and return bytes
+    # Write to BytesIO and return the buffer itself - getvalue() would
+    # duplicate the whole (potentially multi-MB) EPUB just to make bytes
     output = BytesIO()
     epub.write_epub(output, book)
-    return output.getvalue()
+    output.seek(0)
+    return output
@@ -1,28 +1,597 @@
+import atexit
+import base64
+import queue
+import re
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+import socket
+import ssl
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from email.header import Header
+from email.utils import encode_rfc2231, formatdate
+from io import BytesIO
 from .config import Config
+from .pack import recompress_epub
 
+class SendError(Exception):
+    """Base class for delivery failures."""
 
-def send_email(subject: str, file_content: bytes, filename: str):
+
+class TransientSendError(SendError):
+    """
+    The server said try again (4xx) or the connection dropped mid-send.
+    Retrying with backoff is reasonable.
+    """
+
+
+class PermanentSendError(SendError):
+    """
+    The server rejected the message outright (5xx). Retrying the same
+    message will only burn connections.
+    """
+
+
+# Providers throttle long-lived SMTP connections after a while (and some
+# count messages per session), so recycle the connection periodically.
+_MAX_MESSAGES_PER_CONNECTION = 100
+
+# Amazon rejects personal documents above 50MB; catching that locally
+# spares the TCP + TLS + AUTH preamble and a multi-MB DATA upload that
+# would only earn a 552 at the end.
+_MAX_ATTACH = 50 * 1024 * 1024
+
+# One SSLContext shared by every connection. Building a default context
+# per starttls() re-loads the CA bundle from disk each time, and OpenSSL
+# keeps TLS session tickets on the context, so sharing it lets repeat
+# connections to the same server resume with an abbreviated handshake.
+_SSL_CTX = ssl.create_default_context()
+# Every provider we can reach speaks TLS 1.2+; refusing the obsolete
+# protocol versions up front keeps their cipher suites out of the
+# ClientHello and the negotiation that follows.
+_SSL_CTX.minimum_version = ssl.TLSVersion.TLSv1_2
+
+# Dot-stuffing for the DATA payload, as smtplib.SMTP.data() does it
+_QUOTE_PERIODS_RE = re.compile(br'(?m)^\.')
+
+# The MIME structure never varies - one EPUB attachment to one
+# recipient - so the headers are a static template and only the
+# Subject, filename, and payload change per send. This keeps the
+# email package's policy/folding machinery off the hot path entirely.
+_MIME_BOUNDARY = "=-send-to-kindle-attachment-="
+_MESSAGE_TEMPLATE = (
+    "From: %(from)s\r\n"
+    "To: %(to)s\r\n"
+    "Subject: %(subject)s\r\n"
+    "Date: %(date)s\r\n"
+    "Message-ID: <%(message_id)s@sendtokindle>\r\n"
+    "MIME-Version: 1.0\r\n"
+    'Content-Type: multipart/mixed; boundary="%(boundary)s"\r\n'
+    "\r\n"
+    "--%(boundary)s\r\n"
+    "Content-Type: application/epub+zip\r\n"
+    "Content-Transfer-Encoding: base64\r\n"
+    "Content-Disposition: attachment; %(filename_param)s\r\n"
+    "\r\n"
+)
+_MESSAGE_FOOTER = ("\r\n--" + _MIME_BOUNDARY + "--\r\n").encode('ascii')
+
+
+def _xoauth2_initial_response() -> str:
     """
-    Sends an email with the file content as an attachment to the Kindle email address.
+    Base64 SASL initial response for AUTH XOAUTH2, shared with the
+    async sender.
     """
-    msg = MIMEMultipart()
-    msg['From'] = Config.SMTP_USER
-    msg['To'] = Config.KINDLE_EMAIL
-    msg['Subject'] = subject
+    return base64.b64encode(
+        f"user={Config.SMTP_USER}\x01auth=Bearer {Config.SMTP_OAUTH_TOKEN}\x01\x01".encode()
+    ).decode('ascii')
 
-    # Kindle needs an attachment to convert.
-    # We attach the EPUB file.
-    attachment = MIMEApplication(file_content, _subtype="epub+zip")
-    attachment.add_header('Content-Disposition', 'attachment', filename=filename)
-    msg.attach(attachment)
 
+def _encode_header(value: str) -> str:
+    """
+    Returns the value ready for a header line: plain if ASCII,
+    RFC 2047-encoded otherwise (article titles often aren't ASCII).
+    """
+    value = value.replace('\r', ' ').replace('\n', ' ')
     try:
-        with smtplib.SMTP(Config.SMTP_HOST, Config.SMTP_PORT) as server:
-            server.starttls()
+        value.encode('ascii')
+        return value
+    except UnicodeEncodeError:
+        return Header(value, 'utf-8').encode()
+
+
+def _wrap_base64(encoded: bytes) -> bytearray:
+    """
+    Splits one-shot b64encode output into 76-char CRLF-separated lines.
+
+    Writes into a single preallocated bytearray through memoryview
+    slices; joining per-line slices instead allocates an intermediate
+    bytes object for every 76 characters of a multi-MB attachment.
+    """
+    n = len(encoded)
+    lines = (n + 75) // 76
+    out = bytearray(n + max(lines - 1, 0) * 2)
+    src = memoryview(encoded)
+    pos = 0
+    for i in range(0, n, 76):
+        if i:
+            out[pos:pos + 2] = b"\r\n"
+            pos += 2
+        chunk = src[i:i + 76]
+        out[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return out
+
+
+def _filename_param(filename: str) -> str:
+    """
+    Renders the Content-Disposition filename parameter: a plain quoted
+    value for ASCII names, RFC 2231 filename*= otherwise - the same
+    form Message.add_header emits, and the one that keeps the literal
+    .epub extension on the wire for Kindle's format detection (RFC 2047
+    inside the quotes would mangle it).
+    """
+    filename = filename.replace('\r', ' ').replace('\n', ' ')
+    try:
+        filename.encode('ascii')
+        return 'filename="%s"' % filename.replace('"', '')
+    except UnicodeEncodeError:
+        return 'filename*=%s' % encode_rfc2231(filename, 'utf-8')
+
+
+def _render_message(subject: str, b64_payload: bytes, filename: str) -> bytes:
+    """
+    Renders the full message bytes: templated headers, the base64
+    attachment body (already line-wrapped), and the closing boundary.
+    """
+    # uuid4 and formatdate here deliberately sidestep
+    # email.utils.make_msgid, whose getfqdn() call can stall for
+    # seconds behind a slow resolver.
+    header = _MESSAGE_TEMPLATE % {
+        'from': Config.SMTP_USER,
+        'to': Config.KINDLE_EMAIL,
+        'subject': _encode_header(subject),
+        'date': formatdate(usegmt=True),
+        'message_id': uuid.uuid4().hex,
+        'boundary': _MIME_BOUNDARY,
+        'filename_param': _filename_param(filename),
+    }
+    return header.encode('ascii') + b64_payload + _MESSAGE_FOOTER
+
+# Resolved SMTP addresses, kept briefly so every (re)connect doesn't pay
+# a getaddrinfo round trip to the resolver. Bounded TTL tolerates DNS
+# changes on long-running batches.
+_DNS_TTL = 300  # seconds
+_addr_cache = {}
+
+
+def _resolve(host: str, port: int):
+    """
+    Returns a cached (family, sockaddr) for host:port, re-resolving
+    after _DNS_TTL.
+    """
+    key = (host, port)
+    entry = _addr_cache.get(key)
+    now = time.monotonic()
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    info = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    resolved = (info[0][0], info[0][4])
+    _addr_cache[key] = (now + _DNS_TTL, resolved)
+    return resolved
+
+
+# Linux value; socket exposes the constant from 3.10+ on kernels that
+# define it, but the fallback keeps older combinations working.
+_TCP_FASTOPEN_CONNECT = getattr(socket, 'TCP_FASTOPEN_CONNECT', 30)
+
+
+def _open_connection(host, port, timeout, source_address):
+    """
+    create_connection equivalent over the cached DNS answer, with TCP
+    Fast Open requested. With TFO the connect returns immediately and
+    the first write rides the SYN - for implicit TLS that's the
+    ClientHello, shaving an RTT off connection setup. Kernels or
+    networks without TFO just perform a normal handshake.
+    """
+    family, sockaddr = _resolve(host, port)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            sock.settimeout(timeout)
+        if source_address:
+            sock.bind(source_address)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, _TCP_FASTOPEN_CONNECT, 1)
+        except OSError:
+            pass  # kernel predates TFO or it's disabled; connect normally
+        sock.connect(sockaddr)
+        return sock
+    except OSError:
+        sock.close()
+        raise
+
+
+class _CachedAddrSMTP(smtplib.SMTP):
+    """
+    SMTP that connects via the cached DNS answer. The hostname is still
+    what SenderSession passes to wrap_socket, so SNI and certificate
+    validation are unaffected.
+    """
+
+    def _get_socket(self, host, port, timeout):
+        return _open_connection(host, port, timeout, self.source_address)
+
+
+class _CachedAddrSMTP_SSL(smtplib.SMTP_SSL):
+    """
+    SMTP_SSL counterpart; wraps with the configured hostname for SNI
+    and resumes a previous TLS session when the caller supplies one
+    (CPython never reuses client sessions on its own).
+    """
+
+    def __init__(self, *args, tls_session=None, **kwargs):
+        # Stashed before super().__init__, which connects immediately
+        self._tls_session = tls_session
+        super().__init__(*args, **kwargs)
+
+    def _get_socket(self, host, port, timeout):
+        sock = _open_connection(host, port, timeout, self.source_address)
+        return self.context.wrap_socket(
+            sock, server_hostname=self._host, session=self._tls_session
+        )
+
+
+class SenderSession:
+    """
+    Reuses one SMTP connection across a batch of sends.
+
+    Connecting, negotiating TLS, and authenticating costs several round
+    trips; opening the connection once and pushing N messages through it
+    saves (N-1) x (TCP + TLS + AUTH). Use as a context manager:
+
+        with SenderSession() as session:
+            session.send(subject, epub_file, filename)
+
+    A dropped connection is detected with a NOOP ping and reopened
+    transparently before the next send.
+    """
+
+    # EHLO capabilities by (host, port), learned on the first successful
+    # connection. Reconnects to a known server skip the plaintext
+    # pre-STARTTLS EHLO probe - its only job is discovering STARTTLS
+    # support, which the cache already answers.
+    _features_cache = {}
+
+    def __init__(self):
+        self._server = None
+        self._sent_on_connection = 0
+        self._tls_session = None
+
+    def __enter__(self):
+        self._connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _connect(self):
+        if Config.SMTP_PORT == 465:
+            # Implicit TLS: the handshake rides the connect, skipping
+            # the plaintext EHLO / STARTTLS / EHLO preamble (~1 RTT and
+            # two EHLO parses per connection). Reconnects resume the
+            # previous TLS session for an abbreviated handshake.
+            server = _CachedAddrSMTP_SSL(
+                Config.SMTP_HOST, 465, context=_SSL_CTX, tls_session=self._tls_session
+            )
+        else:
+            server = _CachedAddrSMTP(Config.SMTP_HOST, Config.SMTP_PORT)
+            self._starttls(server)
+        self._authenticate(server)
+        # Captured after the auth exchange: TLS 1.3 tickets arrive
+        # post-handshake, so the session is freshest once the server
+        # has actually written to us.
+        self._tls_session = server.sock.session
+        # _authenticate() has EHLOed over the final (TLS) channel by
+        # now; keep the advertised capabilities for future connections.
+        self._features_cache[(Config.SMTP_HOST, Config.SMTP_PORT)] = dict(server.esmtp_features)
+        self._server = server
+        self._sent_on_connection = 0
+
+    def _authenticate(self, server):
+        """
+        Authenticates the freshly secured connection.
+
+        With SMTP_OAUTH_TOKEN set, sends AUTH XOAUTH2 with the initial
+        response inline - one round trip against the three that AUTH
+        LOGIN costs - and the same cached token serves every
+        (re)connection for as long as the provider honors it (~1h).
+        Otherwise falls back to the stock login().
+        """
+        if not Config.SMTP_OAUTH_TOKEN:
             server.login(Config.SMTP_USER, Config.SMTP_PASSWORD)
-            server.send_message(msg)
-    except Exception as e:
-        raise RuntimeError(f"Failed to send email: {e}")
+            return
+        server.ehlo_or_helo_if_needed()
+        code, reply = server.docmd("AUTH", "XOAUTH2 " + _xoauth2_initial_response())
+        if code != 235:
+            raise smtplib.SMTPAuthenticationError(code, reply)
+
+    def _starttls(self, server):
+        """
+        STARTTLS with the shared context, resuming the previous TLS
+        session when this SenderSession has one cached. A resumed
+        (abbreviated) handshake skips the certificate exchange and
+        asymmetric crypto of a full one; an expired session silently
+        falls back to a full handshake inside OpenSSL.
+        """
+        # The cache holds post-STARTTLS features (which never re-
+        # advertise STARTTLS, per RFC 3207), so its mere presence is
+        # the signal: we've completed STARTTLS with this server before.
+        skipped_ehlo = (Config.SMTP_HOST, Config.SMTP_PORT) in self._features_cache
+        if not skipped_ehlo:
+            server.ehlo_or_helo_if_needed()
+        code, reply = server.docmd("STARTTLS")
+        if code != 220 and skipped_ehlo:
+            # A strict server may insist on EHLO before STARTTLS; probe
+            # once and retry rather than failing the reconnect.
+            server.ehlo()
+            code, reply = server.docmd("STARTTLS")
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, reply)
+        server.sock = _SSL_CTX.wrap_socket(
+            server.sock,
+            server_hostname=server._host,
+            session=self._tls_session,
+        )
+        # Mirror smtplib.SMTP.starttls(): the plaintext greeting state
+        # is void once TLS is up, so the next command re-EHLOs.
+        server.file = None
+        server.helo_resp = None
+        server.ehlo_resp = None
+        server.esmtp_features = {}
+        server.does_esmtp = 0
+        self._tls_session = server.sock.session
+
+    def _ensure_connection(self):
+        if self._server is None or self._sent_on_connection >= _MAX_MESSAGES_PER_CONNECTION:
+            self.close()
+            self._connect()
+            return
+        try:
+            self._server.noop()
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Server hung up between sends - reconnect quietly
+            self.close()
+            self._connect()
+
+    def _deliver(self, raw: bytes):
+        """
+        Pushes one serialized message over the cached connection,
+        picking the cheapest path the server supports:
+
+        - CHUNKING (RFC 3030): the payload goes over as-is after
+          `BDAT <size> LAST`, skipping the dot-stuffing scan DATA
+          requires - an O(N) pass over every multi-MB attachment.
+        - PIPELINING (RFC 2920): the envelope commands are written
+          back-to-back and their replies read together, saving two
+          round trips per message. Combines with CHUNKING.
+        - Neither: the stock sendmail sequence.
+        """
+        server = self._server
+        pipelined = 'pipelining' in server.esmtp_features
+        if 'chunking' in server.esmtp_features:
+            self._deliver_bdat(server, raw, pipelined)
+        elif pipelined:
+            self._deliver_pipelined(server, raw)
+        else:
+            server.sendmail(Config.SMTP_USER, [Config.KINDLE_EMAIL], raw)
+
+    def _deliver_bdat(self, server, raw: bytes, pipelined: bool):
+        if pipelined:
+            server.putcmd("mail", f"FROM:<{Config.SMTP_USER}>")
+            server.putcmd("rcpt", f"TO:<{Config.KINDLE_EMAIL}>")
+        else:
+            code, reply = server.mail(Config.SMTP_USER)
+            if code != 250:
+                raise smtplib.SMTPResponseException(code, reply)
+            code, reply = server.rcpt(Config.KINDLE_EMAIL)
+            if code != 250:
+                raise smtplib.SMTPResponseException(code, reply)
+        # RFC 3030 allows BDAT inside a pipeline, so with PIPELINING the
+        # envelope replies are read only after the payload is on the
+        # wire. As in _deliver_pipelined, read every reply before
+        # raising - leftovers would desync the connection.
+        server.putcmd("BDAT", f"{len(raw)} LAST")
+        server.send(raw)
+        replies = [server.getreply() for _ in range(3 if pipelined else 1)]
+        for code, reply in replies:
+            if code != 250:
+                raise smtplib.SMTPResponseException(code, reply)
+
+    def _deliver_pipelined(self, server, raw: bytes):
+        server.putcmd("mail", f"FROM:<{Config.SMTP_USER}>")
+        server.putcmd("rcpt", f"TO:<{Config.KINDLE_EMAIL}>")
+        server.putcmd("data")
+        # Every pipelined command gets a reply; read them all before
+        # acting on a failure, or the leftovers stay buffered and
+        # desync every later exchange on this connection.
+        replies = [server.getreply() for _ in range(3)]
+        failure = next(
+            (reply for reply, want in zip(replies, (250, 250, 354)) if reply[0] != want),
+            None,
+        )
+        if failure is not None:
+            if replies[2][0] == 354:
+                # The server entered DATA state despite the envelope
+                # error; terminate the (empty) message so it leaves it.
+                server.send(b".\r\n")
+                server.getreply()
+            raise smtplib.SMTPResponseException(*failure)
+
+        # Same framing smtplib.SMTP.data() applies: dot-stuff, ensure a
+        # trailing CRLF, then the end-of-data marker.
+        quoted = _QUOTE_PERIODS_RE.sub(b'..', raw)
+        if not quoted.endswith(b"\r\n"):
+            quoted += b"\r\n"
+        server.send(quoted + b".\r\n")
+        code, reply = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPResponseException(code, reply)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def send(self, subject: str, file_content, filename: str):
+        """
+        Sends one email with the file content attached to the Kindle address.
+
+        file_content may be bytes or a BytesIO (as returned by create_epub);
+        a BytesIO is attached via its memoryview so the payload isn't copied.
+        """
+        if isinstance(file_content, BytesIO):
+            file_content = file_content.getbuffer()
+
+        # Optionally squeeze the container before paying base64 + TLS
+        # overhead on every byte (opt-in via RECOMPRESS_EPUB)
+        if Config.RECOMPRESS_EPUB:
+            file_content = recompress_epub(file_content)
+
+        # Checked after recompression, which may bring a borderline
+        # file back under the limit.
+        if len(file_content) > _MAX_ATTACH:
+            raise ValueError(
+                f"'{filename}' is {len(file_content) / (1024 * 1024):.1f}MB; "
+                f"Kindle rejects attachments over {_MAX_ATTACH // (1024 * 1024)}MB"
+            )
+
+        # Kindle needs an attachment to convert.
+        # Base64-encode the EPUB in one C call; the default MIME encoder
+        # would walk it in 57-byte chunks and hold the result as a
+        # second full-size str copy of the payload.
+        encoded = base64.b64encode(file_content)
+        raw = _render_message(subject, _wrap_base64(encoded), filename)
+
+        try:
+            self._ensure_connection()
+            self._deliver(raw)
+        except smtplib.SMTPResponseException as e:
+            # A failure mid-transaction leaves the connection in an
+            # unknowable protocol state; drop it so a retry starts from
+            # a fresh one rather than inheriting stale replies.
+            self.close()
+            detail = f"{e.smtp_code} {e.smtp_error}"
+            if 400 <= e.smtp_code < 500:
+                raise TransientSendError(detail) from e
+            raise PermanentSendError(detail) from e
+        except (smtplib.SMTPServerDisconnected, TimeoutError, socket.timeout) as e:
+            # socket.timeout is only an alias of TimeoutError from
+            # 3.10; listing both keeps send timeouts typed on 3.9
+            self.close()
+            raise TransientSendError(str(e)) from e
+        self._sent_on_connection += 1
+
+
+_STOP = object()
+
+# Backoff schedule for transient (4xx / dropped-connection) failures.
+# Permanent rejections are never retried - repeating a 5xx only burns
+# whole connections for the same answer.
+_RETRY_DELAYS = (1.0, 2.0, 4.0)
+
+
+class SendWorker(threading.Thread):
+    """
+    Background sender fed by a bounded queue.
+
+    enqueue() returns a Future immediately, so callers go straight back
+    to fetching while the worker drains sends over one persistent
+    SenderSession - every message reuses the same connection and the
+    SMTP latency hides behind the rest of the pipeline. flush() blocks
+    until the queue is empty (also registered atexit so queued sends
+    can't be lost on interpreter shutdown); close() flushes and stops
+    the thread.
+    """
+
+    def __init__(self, max_queue: int = 64):
+        super().__init__(name="kindle-send-worker", daemon=True)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._session = SenderSession()
+        self._closed = False
+        atexit.register(self.flush)
+        self.start()
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    break
+                future, subject, file_content, filename = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    self._send_with_retry(subject, file_content, filename)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
+            finally:
+                self._queue.task_done()
+        self._session.close()
+
+    def _send_with_retry(self, subject: str, file_content, filename: str):
+        delays = iter(_RETRY_DELAYS)
+        while True:
+            try:
+                self._session.send(subject, file_content, filename)
+                return
+            except TransientSendError:
+                delay = next(delays, None)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def enqueue(self, subject: str, file_content, filename: str) -> Future:
+        """
+        Queues one send and returns a Future resolving when it completes.
+        """
+        if self._closed:
+            raise RuntimeError("SendWorker is closed")
+        future = Future()
+        self._queue.put((future, subject, file_content, filename))
+        return future
+
+    def flush(self):
+        """
+        Blocks until every queued send has been attempted.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Flushes outstanding sends, quits the SMTP session, and stops
+        the worker thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self.join()
+
+
+def send_email(subject: str, file_content, filename: str):
+    """
+    Sends a single email, opening and closing its own SMTP session.
+    Callers with several messages should hold a SenderSession instead.
+
+    Raises TransientSendError for failures worth retrying (4xx replies,
+    dropped connections) and PermanentSendError for outright rejections.
+    """
+    with SenderSession() as session:
+        session.send(subject, file_content, filename)
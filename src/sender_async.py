@@ -0,0 +1,100 @@
+import asyncio
+import base64
+from io import BytesIO
+
+import aiosmtplib
+
+from .config import Config
+from .sender import _SSL_CTX, _render_message, _wrap_base64, _xoauth2_initial_response
+
+
+def _serialize(subject: str, file_content, filename: str) -> bytes:
+    """
+    Renders the full message bytes once, via the same template path the
+    sync sender uses; aiosmtplib then ships them as-is instead of
+    re-flattening a MIME tree per send.
+    """
+    if isinstance(file_content, BytesIO):
+        file_content = file_content.getbuffer()
+    return _render_message(subject, _wrap_base64(base64.b64encode(file_content)), filename)
+
+
+def _new_smtp() -> aiosmtplib.SMTP:
+    use_tls = Config.SMTP_PORT == 465
+    return aiosmtplib.SMTP(
+        hostname=Config.SMTP_HOST,
+        port=Config.SMTP_PORT,
+        use_tls=use_tls,
+        start_tls=not use_tls or None,
+        tls_context=_SSL_CTX,
+    )
+
+
+async def _login(smtp: aiosmtplib.SMTP):
+    """
+    Authenticates with AUTH XOAUTH2 when a token is configured,
+    mirroring SenderSession._authenticate; password login otherwise.
+    """
+    if Config.SMTP_OAUTH_TOKEN:
+        response = await smtp.execute_command(
+            b"AUTH", b"XOAUTH2 " + _xoauth2_initial_response().encode('ascii')
+        )
+        if response.code != 235:
+            raise aiosmtplib.SMTPAuthenticationError(response.code, response.message)
+    else:
+        await smtp.login(Config.SMTP_USER, Config.SMTP_PASSWORD)
+
+
+async def send_email_async(subject: str, file_content, filename: str):
+    """
+    Sends a single message over its own connection. For several messages
+    use send_batch, which fans the work out over parallel connections.
+    """
+    raw = _serialize(subject, file_content, filename)
+    smtp = _new_smtp()
+    await smtp.connect()
+    try:
+        await _login(smtp)
+        await smtp.sendmail(Config.SMTP_USER, [Config.KINDLE_EMAIL], raw)
+    finally:
+        await smtp.quit()
+
+
+async def send_batch(jobs: list):
+    """
+    Sends a batch of (subject, file_content, filename) jobs over up to
+    Config.SMTP_POOL_SIZE parallel connections. Each worker owns one
+    authenticated connection and drains jobs from a shared queue, so
+    TLS handshakes and DATA uploads overlap across sockets while every
+    individual connection is still reused for many messages.
+    """
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+    if queue.empty():
+        return
+
+    async def worker():
+        smtp = _new_smtp()
+        await smtp.connect()
+        try:
+            await _login(smtp)
+            while True:
+                try:
+                    subject, file_content, filename = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                raw = _serialize(subject, file_content, filename)
+                await smtp.sendmail(Config.SMTP_USER, [Config.KINDLE_EMAIL], raw)
+        finally:
+            await smtp.quit()
+
+    workers = min(Config.SMTP_POOL_SIZE, queue.qsize())
+    await asyncio.gather(*(worker() for _ in range(max(workers, 1))))
+
+
+def send_batch_sync(jobs: list):
+    """
+    Synchronous convenience wrapper around send_batch.
+    """
+    asyncio.run(send_batch(jobs))